@@ -1,11 +1,15 @@
-from mcp import ClientSession, StdioServerParameters
-from mcp.client.stdio import stdio_client
+from mcp import ClientSession, StdioServerParameters, stdio_client, types
+from mcp.shared.message import SessionMessage
 from langchain_openai import ChatOpenAI
 from langchain_mcp_adapters.tools import load_mcp_tools
 from langgraph.prebuilt import create_react_agent
 from dotenv import load_dotenv
+from contextlib import AsyncExitStack, asynccontextmanager
 import os
+import socket
+import struct
 import asyncio
+import anyio
 
 # Load environment variables
 load_dotenv()
@@ -14,6 +18,8 @@ load_dotenv()
 openai_model_name = os.getenv("OPENAI_MODEL_NAME")
 openai_api_base = os.getenv("OPENAI_API_BASE")
 openai_api_key = os.getenv("OPENAI_API_KEY")
+# "socket" talks to servers that accept --socket-fd (this repo's server); "stdio" works with any MCP server
+mcp_transport = os.getenv("MCP_TRANSPORT", "stdio")
 
 # Verify environment variables
 if not all([openai_model_name, openai_api_base, openai_api_key]):
@@ -33,28 +39,135 @@ model = ChatOpenAI(
     temperature=0.7
 )
 
-async def run_agent():
-  async with stdio_client(server_params) as (read, write):
-    # Open an MCP session to interact with the math_server.py tool.
-    async with ClientSession(read, write) as session:
-      # Initialize the session.
-      await session.initialize()
-      # Load tools
-      tools = await load_mcp_tools(session)
-      #print(tools)
-
-      # Create a ReAct agent.
-      agent = create_react_agent(model, tools)
+# Each frame on the socket transport is a big-endian uint32 length followed by a JSON-RPC message
+FRAME_HEADER = struct.Struct("!I")
+# Larger lengths can only come from a corrupt header, and are not worth allocating for
+MAX_FRAME_SIZE = 64 << 20
+SOCKET_BUFFER_SIZE = 1 << 20
+
+@asynccontextmanager
+async def socket_client(server: StdioServerParameters):
+  # Spawn the server on one end of a unix socketpair instead of stdio pipes.
+  parent_sock, child_sock = socket.socketpair(socket.AF_UNIX, socket.SOCK_STREAM)
+  for sock in (parent_sock, child_sock):
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, SOCKET_BUFFER_SIZE)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, SOCKET_BUFFER_SIZE)
+  process = await asyncio.create_subprocess_exec(
+    server.command, *server.args, "--socket-fd", str(child_sock.fileno()),
+    env=server.env,
+    pass_fds=(child_sock.fileno(),),
+  )
+  child_sock.close()
+  reader, writer = await asyncio.open_unix_connection(sock=parent_sock)
+
+  read_stream_writer, read_stream = anyio.create_memory_object_stream(0)
+  write_stream, write_stream_reader = anyio.create_memory_object_stream(0)
+
+  async def socket_reader():
+    async with read_stream_writer:
+      while True:
+        try:
+          header = await reader.readexactly(FRAME_HEADER.size)
+          (size,) = FRAME_HEADER.unpack(header)
+          if size > MAX_FRAME_SIZE:
+            # The stream cannot be resynchronized after a bad header
+            await read_stream_writer.send(ValueError(f"Frame of {size} bytes exceeds {MAX_FRAME_SIZE}"))
+            return
+          payload = await reader.readexactly(size)
+        except asyncio.IncompleteReadError:
+          # Server closed the socket
+          return
+        try:
+          message = types.JSONRPCMessage.model_validate_json(payload)
+        except Exception as exc:
+          await read_stream_writer.send(exc)
+          continue
+        await read_stream_writer.send(SessionMessage(message))
+
+  async def socket_writer():
+    async with write_stream_reader:
+      async for session_message in write_stream_reader:
+        payload = session_message.message.model_dump_json(by_alias=True, exclude_none=True).encode()
+        writer.write(FRAME_HEADER.pack(len(payload)) + payload)
+        await writer.drain()
+
+  async with anyio.create_task_group() as tg:
+    tg.start_soon(socket_reader)
+    tg.start_soon(socket_writer)
+    try:
+      yield read_stream, write_stream
+    finally:
+      # Closing the socket lets the server see EOF and exit.
+      writer.close()
+      try:
+        await asyncio.wait_for(process.wait(), timeout=2)
+      except asyncio.TimeoutError:
+        process.kill()
+      tg.cancel_scope.cancel()
+
+class AgentPool:
+  # Keeps one server process, MCP session and compiled ReAct agent per server,
+  # so the MCP handshake and graph build are paid once per pool instead of once
+  # per prompt.
+
+  def __init__(self, model, transport=mcp_transport):
+    self.model = model
+    self.transport = transport
+    self._stack = AsyncExitStack()
+    self._sessions = {}
+    self._locks = {}
+    self._connect_lock = asyncio.Lock()
+
+  async def __aenter__(self):
+    return self
+
+  async def __aexit__(self, *exc_info):
+    await self._stack.aclose()
+
+  async def _ensure_session(self, server):
+    # Starts the server and opens its session on first use; returns the pool key.
+    # Servers started with different args or env (e.g. two databases) get separate sessions.
+    key = (server.command, tuple(server.args), tuple(sorted((server.env or {}).items())))
+    async with self._connect_lock:
+      if key not in self._sessions:
+        connect = socket_client if self.transport == "socket" else stdio_client
+        read, write = await self._stack.enter_async_context(connect(server))
+        session = await self._stack.enter_async_context(ClientSession(read, write))
+        # Initialize the session and load its tools once.
+        await session.initialize()
+        tools = await load_mcp_tools(session)
+        # The tools are bound to this session, so the agent built on them is too.
+        agent = create_react_agent(self.model, tools)
+        self._sessions[key] = (session, agent)
+        self._locks[key] = asyncio.Lock()
+    return key
+
+  async def ask(self, prompt, server=server_params, verbose=False):
+    # Returns the final answer text; verbose=True returns the full message
+    # trajectory (tool calls and results) for debugging.
+    key = await self._ensure_session(server)
+    # One agent run at a time per session.
+    async with self._locks[key]:
+      _, agent = self._sessions[key]
       # Run the agent.
-      agent_response = await agent.ainvoke(
-      # Now, let's give our message.
-       {"messages": "Please give the list of tables"})
+      agent_response = await agent.ainvoke({"messages": prompt})
       # Return the response.
-      messages =  agent_response["messages"]
-      return messages
-      
+      messages = agent_response["messages"]
+      if verbose:
+        return messages
+      return messages[-1].content
+
+async def main():
+  # Read prompts from stdin so the MCP server is started once for the whole session.
+  async with AgentPool(model) as pool:
+    while True:
+      try:
+        prompt = await asyncio.to_thread(input, "> ")
+      except EOFError:
+        break
+      if not prompt.strip():
+        continue
+      print(await pool.ask(prompt))
 
 if __name__ == "__main__":
-  result = asyncio.run(run_agent())
-  length = len(result)
-  print (result[length-1])
+  asyncio.run(main())
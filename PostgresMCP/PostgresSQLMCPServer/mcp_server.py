@@ -1,15 +1,33 @@
 #!/usr/bin/env python
 
+import asyncio
 import logging
 import os
-import json
+import hashlib
+import re
+import orjson
+import socket
+import struct
+import uuid
+from functools import lru_cache
+from io import StringIO
 from contextlib import asynccontextmanager
+from collections import deque
 from collections.abc import AsyncIterator
 from dataclasses import dataclass
 from dotenv import load_dotenv
-from typing import Dict, List, Any, Optional
+from typing import Dict, List, Any, Optional, Tuple, Callable, Awaitable, Deque
+import anyio
+import msgspec
+from cachetools import TTLCache
+from mcp import types
 from mcp.server.fastmcp import FastMCP, Context
-from legion_query_runner import QueryRunner
+from mcp.server.fastmcp.prompts.base import Message, UserMessage
+from mcp.shared.message import SessionMessage
+from sqlalchemy import TextClause, text
+from sqlalchemy.engine import URL
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncEngine, AsyncResult, create_async_engine
 import sys
 import argparse
 
@@ -17,15 +35,214 @@ import argparse
 load_dotenv()
 logger = logging.getLogger("server")
 
-# Initialize the Legion Query Runner
-def init_query_runner():
+# SQLAlchemy drivers for the supported database types
+_DRIVERS = {
+    "pg": "postgresql+asyncpg",
+    "postgres": "postgresql+asyncpg",
+    "postgresql": "postgresql+asyncpg",
+}
 
+# Rows fetched per round trip when streaming results through a server-side cursor
+_FETCH_SIZE = 1000
+
+# Catalog queries, limited to user schemas
+_TABLES_QUERY = """
+SELECT table_schema, table_name FROM information_schema.tables
+WHERE table_schema NOT IN ('pg_catalog', 'information_schema')
+ORDER BY table_schema, table_name
+"""
+_COLUMNS_QUERY = """
+SELECT table_schema, table_name, column_name, data_type FROM information_schema.columns
+WHERE table_schema NOT IN ('pg_catalog', 'information_schema')
+ORDER BY table_schema, table_name, ordinal_position
+"""
+_TABLES_COLUMNS_QUERY = """
+SELECT table_schema, table_name, column_name, data_type FROM information_schema.columns
+WHERE table_schema NOT IN ('pg_catalog', 'information_schema')
+  AND (table_name = ANY(:tables) OR table_schema || '.' || table_name = ANY(:tables))
+ORDER BY table_schema, table_name, ordinal_position
+"""
+
+@dataclass
+class RowBatch:
+    """Query result as fetched from the driver
+
+    rows holds the fetched row tuples in column_names order; row_count is the size
+    of the whole result, which can exceed the fetched rows when a limit was applied.
+    """
+    column_names: List[str]
+    rows: List[Any]
+    row_count: int
+
+# Encodes execute_query_json output for statements Postgres does not encode itself,
+# matching json_agg: compact, numerics as numbers, dates and times in ISO 8601
+_JSON_ENCODER = msgspec.json.Encoder(decimal_format="number", enc_hook=str)
+
+# Comments, string literals, quoted identifiers and dollar-quoted bodies, i.e. everything
+# whose words are not SQL keywords. Block comments use the unrolled form so a match always
+# ends at the first "*/" instead of backtracking past it.
+_SQL_NOISE_PATTERN = re.compile(
+    r"--[^\n]*"
+    r"|/\*[^*]*\*+(?:[^/*][^*]*\*+)*/"
+    r"|(?<!\w)[Ee]'(?:[^'\\]|\\.|'')*'"
+    r"|'(?:[^']|'')*'"
+    r'|"(?:[^"]|"")*"'
+    r"|\$([A-Za-z_]\w*|)\$.*?\$\1\$",
+    re.DOTALL,
+)
+_WORD_PATTERN = re.compile(r"[A-Za-z_]\w*")
+
+def _user_sql(query: str) -> TextClause:
+    """Wrap user-supplied SQL in text() without treating ':name' as a bind parameter"""
+    return text(query.replace(":", "\\:"))
+
+def _strip_comment(match: "re.Match[str]") -> str:
+    token = match.group(0)
+    return " " if token.startswith(("--", "/*")) else token
+
+def _subquery(query: str) -> str:
+    """Strip a user query so it can be embedded as a subquery"""
+    # Comments go first so a trailing "; -- note" cannot hide the semicolon
+    body = _SQL_NOISE_PATTERN.sub(_strip_comment, query).rstrip(" \t\r\n\f\v;").lstrip()
+    # Newlines keep the statement apart from the surrounding parentheses
+    return f"(\n{body}\n)"
+
+def _table_key(table_schema: str, table_name: str) -> str:
+    """Name a table as queries should refer to it: qualified unless it is in public"""
+    return table_name if table_schema == "public" else f"{table_schema}.{table_name}"
+
+class QueryRunner:
+    """Runs queries over a pooled async SQLAlchemy engine"""
+
+    def __init__(self, engine: AsyncEngine):
+        self.engine = engine
+
+    async def test_connection(self) -> None:
+        async with self.engine.connect() as conn:
+            await conn.execute(text("SELECT 1"))
+
+    async def _fetch_all(self, query: str, **params: Any) -> List[Any]:
+        # Each call checks out its own connection so catalog queries can run concurrently
+        async with self.engine.connect() as conn:
+            result = await conn.execute(text(query), params)
+            return result.all()
+
+    async def run_query(self, query: str, limit: Optional[int] = None, stream: bool = False) -> RowBatch:
+        """Run a query; with stream=True (SELECT/WITH only) rows are read through a server-side cursor
+
+        When streaming with a limit, only the first `limit` rows are fetched and
+        row_count is computed with a separate COUNT(*) if there are more.
+        """
+        # begin() commits on success so data-modifying statements persist. Streamed
+        # reads use one snapshot, so a separate COUNT(*) sees the same rows.
+        engine = self.engine.execution_options(isolation_level="REPEATABLE READ") if stream else self.engine
+        async with engine.begin() as conn:
+            if not stream:
+                result = await conn.execute(_user_sql(query))
+                if not result.returns_rows:
+                    return RowBatch(column_names=[], rows=[], row_count=0)
+                column_names = list(result.keys())
+                rows = result.all()
+                row_count = len(rows)
+            else:
+                result = await conn.stream(_user_sql(query), execution_options={"yield_per": _FETCH_SIZE})
+                column_names = list(result.keys())
+                if limit is None:
+                    rows = []
+                    async for partition in result.partitions():
+                        rows.extend(partition)
+                    row_count = len(rows)
+                else:
+                    rows = await result.fetchmany(limit + 1)
+                    row_count = len(rows)
+                    if row_count > limit:
+                        rows = rows[:limit]
+                        row_count = await self._count_rows(conn, query, result, row_count)
+                    await result.close()
+        return RowBatch(column_names=column_names, rows=rows, row_count=row_count)
+
+    async def _count_rows(self, conn: AsyncConnection, query: str, result: AsyncResult, fetched: int) -> int:
+        """Count the rows of a read-only query, preferably with COUNT(*) on the server
+
+        `result` is the query's still open cursor, from which `fetched` rows were already read.
+        """
+        try:
+            # A savepoint keeps the transaction usable if the wrapped query is rejected
+            async with conn.begin_nested():
+                count = await conn.execute(
+                    _user_sql(f"SELECT count(*) FROM {_subquery(query)} AS _mcp_count")
+                )
+                return count.scalar_one()
+        except DBAPIError:
+            # Not valid as a subquery; drain the open cursor rather than running the query again
+            row_count = fetched
+            async for partition in result.partitions():
+                row_count += len(partition)
+            return row_count
+
+    async def run_query_json(self, query: str) -> str:
+        """Run a SELECT/WITH query and have Postgres encode the rows as JSON
+
+        Returns the execute_query_json document. json_agg (not jsonb_agg) keeps the
+        column order, and the ::text cast stops the driver from decoding the result.
+        """
+        subquery = _subquery(query)
+        async with self.engine.begin() as conn:
+            # LIMIT 0 fetches no rows but still reports the column names
+            result = await conn.execute(_user_sql(f"SELECT * FROM {subquery} AS _mcp_q LIMIT 0"))
+            column_names = list(result.keys())
+            result = await conn.execute(_user_sql(
+                f"SELECT coalesce(json_agg(_mcp_q), '[]'::json)::text, count(*) FROM {subquery} AS _mcp_q"
+            ))
+            rows_json, row_count = result.one()
+        columns_json = orjson.dumps(column_names).decode()
+        return f'{{"columns": {columns_json}, "rows": {rows_json}, "row_count": {row_count}}}'
+
+    async def get_schema(self) -> List[Dict[str, Any]]:
+        tables, columns = await asyncio.gather(
+            self._fetch_all(_TABLES_QUERY),
+            self._fetch_all(_COLUMNS_QUERY),
+        )
+        schema = {_table_key(table_schema, table_name): [] for table_schema, table_name in tables}
+        for table_schema, table_name, column_name, _ in columns:
+            table_key = _table_key(table_schema, table_name)
+            if table_key in schema:
+                schema[table_key].append(column_name)
+        return [{'name': name, 'columns': cols} for name, cols in schema.items()]
+
+    async def describe_tables(self, tables: Optional[List[str]] = None) -> Dict[str, Dict[str, Any]]:
+        if tables is None:
+            rows = await self._fetch_all(_COLUMNS_QUERY)
+        else:
+            rows = await self._fetch_all(_TABLES_COLUMNS_QUERY, tables=list(tables))
+        description = {}
+        for table_schema, table_name, column_name, data_type in rows:
+            table = description.setdefault(_table_key(table_schema, table_name), {'columns': [], 'types': {}})
+            table['columns'].append(column_name)
+            table['types'][column_name] = data_type
+        return description
+
+def parse_args() -> argparse.Namespace:
     # Use command line arguments for direct execution
     parser = argparse.ArgumentParser(description='Legion MCP Server')
-    parser.add_argument('--db-type', required=False, help='Database type (e.g., mysql, postgresql)')
+    parser.add_argument('--db-type', required=False, help='Database type (e.g., pg, postgresql)')
     parser.add_argument('--db-config', required=False, help='JSON string containing database configuration')
+    parser.add_argument('--socket-fd', type=int, required=False, help='Serve MCP over this inherited unix socket instead of stdio')
+    # Under `mcp run` / `mcp dev`, sys.argv holds the CLI's own arguments, which must not stop the server
+    return parser.parse_known_args()[0]
+
+class DbConfig(msgspec.Struct, kw_only=True):
+    """Database connection settings from DB_CONFIG / --db-config"""
+    host: str
+    port: int = 5432
+    user: str
+    password: str
+    database: str
+    sslmode: str = "prefer"
+    pooler: Optional[str] = None
 
-    args = parser.parse_args()
+def _create_query_runner() -> QueryRunner:
+    args = parse_args()
     db_type = args.db_type
     db_config_str = args.db_config
     # Only parse args if we're not in MCP CLI mode
@@ -33,69 +250,150 @@ def init_query_runner():
         db_type = os.getenv("DB_TYPE", "pg")
     if not db_config_str:
         db_config_str = os.getenv("DB_CONFIG", "")
-    db_config = json.loads(db_config_str)
-
-    if not db_type or not db_config:
+    if not db_type or not db_config_str:
         raise ValueError("Database type and configuration are required")
 
-    print(f"Initializing query runner for {db_type} database...")
-        
-    return QueryRunner(db_type=db_type, configuration=db_config)
+    # Validates field names and types while parsing
+    db_config = msgspec.json.decode(db_config_str, type=DbConfig)
 
-try:
-    query_runner = init_query_runner()
-except Exception as e:
-    print(f"Error initializing query runner: {str(e)}")
-    print("\nUsage:")
-    print("1. For MCP CLI mode:")
-    print("   Set environment variables: DB_TYPE, DB_HOST, DB_PORT, DB_USER, DB_PASSWORD, DB_NAME")
-    print("   Then run: mcp install mcp_server.py")
-    print("   Or: mcp dev mcp_server.py")
-    print("\n2. For direct execution:")
-    print("   python mcp_server.py --db-type <db_type> --db-config '<json_config>'")
-    print("   Example: python mcp_server.py --db-type mysql --db-config '{\"host\":\"localhost\",\"port\":3306,\"user\":\"root\",\"password\":\"pass\",\"database\":\"test\"}'")
-    sys.exit(1)
+    if db_type not in _DRIVERS:
+        raise ValueError(f"Unsupported database type: {db_type}")
+
+    print(f"Initializing query runner for {db_type} database...", file=sys.stderr)
+
+    url = URL.create(
+        _DRIVERS[db_type],
+        username=db_config.user,
+        password=db_config.password,
+        host=db_config.host,
+        port=db_config.port,
+        database=db_config.database,
+    )
+    connect_args = {"ssl": db_config.sslmode}
+    if db_config.pooler == "pgbouncer":
+        # PgBouncer in transaction mode may hand each transaction a different backend,
+        # so prepared statements must be neither cached nor reused by name
+        url = url.update_query_dict({"prepared_statement_cache_size": "0"})
+        connect_args.update(
+            statement_cache_size=0,
+            prepared_statement_name_func=lambda: f"__asyncpg_{uuid.uuid4()}__",
+        )
+    # Reuse connections across tool calls instead of reconnecting per query.
+    # asyncpg already uses the binary protocol (numeric arrives as Decimal, uuid as UUID);
+    # json/jsonb values are decoded by the dialect's binary codecs through orjson.
+    engine = create_async_engine(
+        url,
+        connect_args=connect_args,
+        json_serializer=lambda obj: orjson.dumps(obj).decode(),
+        json_deserializer=orjson.loads,
+        pool_size=int(os.getenv("DB_POOL_SIZE", "5")),
+        max_overflow=int(os.getenv("DB_MAX_OVERFLOW", "10")),
+        pool_pre_ping=True,
+        pool_recycle=1800,
+    )
+    return QueryRunner(engine)
+
+# Error from the last failed initialization, reported by tools that need the database
+_init_error: Optional[Exception] = None
+
+# Initialize the query runner
+@lru_cache(maxsize=1)
+def init_query_runner() -> Optional[QueryRunner]:
+    """Create the query runner once, or return None if the database is not configured"""
+    global _init_error
+    try:
+        return _create_query_runner()
+    except Exception as e:
+        _init_error = e
+        print(f"Error initializing query runner: {str(e)}", file=sys.stderr)
+        print("\nUsage:", file=sys.stderr)
+        print("1. For MCP CLI mode:", file=sys.stderr)
+        print("   Set environment variables: DB_TYPE, DB_CONFIG (optional: DB_POOL_SIZE, DB_MAX_OVERFLOW)", file=sys.stderr)
+        print("   Then run: mcp install mcp_server.py", file=sys.stderr)
+        print("   Or: mcp dev mcp_server.py", file=sys.stderr)
+        print("\n2. For direct execution:", file=sys.stderr)
+        print("   python mcp_server.py --db-type <db_type> --db-config '<json_config>'", file=sys.stderr)
+        print("   Example: python mcp_server.py --db-type pg --db-config '{\"host\":\"localhost\",\"port\":5432,\"user\":\"postgres\",\"password\":\"pass\",\"database\":\"test\"}'", file=sys.stderr)
+        return None
+
+def _db_not_configured() -> str:
+    return f"Database not available: {_init_error}"
+
+# Number of recent queries kept in the session history
+_QUERY_HISTORY_SIZE = 500
 
 # Define database context that will be available to all handlers
 @dataclass
 class DbContext:
-    query_runner: QueryRunner
+    query_runner: Optional[QueryRunner]
     last_query: Optional[str] = None
-    last_result: Optional[Dict[str, Any]] = None
-    query_history: List[str] = None
+    last_result: Optional[RowBatch] = None
+    query_history: Deque[str] = None
+    # The same history pre-formatted as markdown list items for get_query_history
+    query_history_formatted: Deque[str] = None
     
     def __post_init__(self):
+        # Keep only the most recent queries so long sessions do not grow without bound
         if self.query_history is None:
-            self.query_history = []
+            self.query_history = deque(maxlen=_QUERY_HISTORY_SIZE)
+        if self.query_history_formatted is None:
+            self.query_history_formatted = deque(maxlen=_QUERY_HISTORY_SIZE)
 
 # Server lifespan manager
 @asynccontextmanager
 async def db_lifespan(server: FastMCP) -> AsyncIterator[DbContext]:
     """Initialize database connection on startup and provide context to handlers"""
     
+    # Connect lazily here rather than at import, so a misconfigured database
+    # only disables the database tools instead of stopping the server
+    query_runner = init_query_runner()
+    
     # Initialize context
     db_context = DbContext(
         query_runner=query_runner,
     )
     
+    global _init_error
     try:
         # Test connection on startup
-        query_runner.test_connection()
+        if query_runner is not None:
+            try:
+                await query_runner.test_connection()
+            except Exception as e:
+                # Unreachable host, wrong credentials, ...: keep serving with the database tools disabled
+                _init_error = e
+                print(f"Error connecting to database: {str(e)}", file=sys.stderr)
+                db_context.query_runner = None
         yield db_context
     finally:
-        # Cleanup could happen here if needed
-        pass
+        # Close pooled connections
+        if query_runner is not None:
+            await query_runner.engine.dispose()
 
 # Pass lifespan to server
 mcp = FastMCP("Legion Database Access", lifespan=db_lifespan)
 
+# Cache of catalog lookups keyed by (tool name, tables); schemas change rarely
+_schema_cache = TTLCache(maxsize=256, ttl=300)
+
+async def _cached_catalog(key: Tuple[str, Any], fetch: Callable[[], Awaitable[Any]]) -> Any:
+    """Return a cached catalog lookup, fetching it on a miss"""
+    if key in _schema_cache:
+        return _schema_cache[key]
+    value = await fetch()
+    _schema_cache[key] = value
+    return value
+
 # Define resources
 @mcp.resource("schema://all")
-def get_schema() -> str:
+async def get_schema() -> str:
     """Get the database schema"""
+    query_runner = init_query_runner()
+    if query_runner is None:
+        return _db_not_configured()
     try:
-        schema = query_runner.get_schema()
-        return json.dumps(schema)
+        schema = await _cached_catalog(("get_schema", None), query_runner.get_schema)
+        return orjson.dumps(schema).decode()
     except Exception as e:
         return f"Error getting schema: {str(e)}"
 
@@ -105,123 +403,309 @@ def get_query_history(ctx: Context) -> str:
     db_context = ctx.request_context.lifespan_context
     
     if db_context.query_history:
-        history_list = "\n".join([f"- {query}" for query in db_context.query_history])
+        history_list = "\n".join(db_context.query_history_formatted)
         return f"Query history:\n{history_list}"
     else:
         return "No queries have been executed yet."
 
-def _execute_and_get_results(query: str, ctx: Context) -> Dict[str, Any]:
-    """Helper function to execute query and get formatted results"""
+# Cache of query results keyed by (query hash, row limit or "json")
+_result_cache = TTLCache(maxsize=512, ttl=30)
+
+# Statements that may be cached when they do not modify anything
+_READ_ONLY_STATEMENTS = {"SELECT", "WITH", "SHOW", "EXPLAIN"}
+
+# Words that turn a SELECT/WITH into a write: data-modifying CTEs and SELECT ... INTO
+_WRITE_WORDS = {"INSERT", "UPDATE", "DELETE", "MERGE", "INTO"}
+
+# Read-only statements that can also be wrapped in a subquery and streamed from a cursor
+_STREAMABLE_STATEMENTS = {"SELECT", "WITH"}
+
+# SQLSTATEs Postgres raises when a statement is not valid as a subquery:
+# feature_not_supported (e.g. a nested data-modifying WITH) and syntax_error
+_NESTING_SQLSTATES = {"0A000", "42601"}
+
+def _cache_key(query: str) -> str:
+    """Build the result cache key from the query text"""
+    # Only surrounding whitespace is stripped: lowercasing or collapsing spaces would
+    # also change string literals and quoted identifiers, making distinct queries collide
+    return hashlib.blake2b(query.strip().encode()).hexdigest()
+
+@lru_cache(maxsize=1024)
+def _read_only_kind(query: str) -> Optional[str]:
+    """Return the leading keyword of a read-only statement that can be cached, or None
+
+    This errs on the side of None: a keyword such as UPDATE anywhere outside literals
+    and comments is enough to treat the statement as a write.
+    """
+    code = _SQL_NOISE_PATTERN.sub(" ", query)
+    words = [word.upper() for word in _WORD_PATTERN.findall(code)]
+    if not words or words[0] not in _READ_ONLY_STATEMENTS:
+        return None
+    # Several statements in one call
+    if ";" in code.rstrip(" \t\r\n\f\v;"):
+        return None
+    kind = words[0]
+    # EXPLAIN ANALYZE executes the statement it explains
+    if kind == "EXPLAIN" and ("ANALYZE" in words or "ANALYSE" in words):
+        return None
+    if kind in _STREAMABLE_STATEMENTS and _WRITE_WORDS.intersection(words):
+        return None
+    return kind
+
+def _record_query(ctx: Context, query: str, batch: Optional[RowBatch]) -> None:
+    """Update query history in the context"""
     db_context = ctx.request_context.lifespan_context
-    
-    # Execute query
-    result = query_runner.run_query(query)
-    
-    # Update query history in the context
     db_context.last_query = query
-    db_context.last_result = result
+    db_context.last_result = batch
     db_context.query_history.append(query)
+    db_context.query_history_formatted.append(f"- {query}")
+
+async def _execute_and_get_results(query: str, ctx: Context, limit: Optional[int] = None) -> Dict[str, Any]:
+    """Helper function to execute query and get formatted results
+
+    Read-only queries are streamed from a server-side cursor, so with a limit only
+    the first `limit` rows are fetched; 'row_count' always covers the whole result.
+    """
+    kind = _read_only_kind(query)
+    cacheable = kind is not None
+    key = (_cache_key(query), limit)
+    if cacheable and key in _result_cache:
+        batch = _result_cache[key]
+    else:
+        # Execute query
+        query_runner = ctx.request_context.lifespan_context.query_runner
+        batch = await query_runner.run_query(query, limit=limit, stream=kind in _STREAMABLE_STATEMENTS)
+        if cacheable:
+            _result_cache[key] = batch
+        else:
+            # Any other statement may modify data or schema, so cached results can no longer be trusted
+            _result_cache.clear()
+            _schema_cache.clear()
     
-    # Extract column info
-    columns = result.get('columns', [])
-    column_names = [col.get('friendly_name', col.get('name', '')) for col in columns]
-    
-    # Extract row data
-    rows = result.get('rows', [])
-    row_count = len(rows)
-    
-    # Process rows - each row is a dictionary with column names as keys
-    processed_rows = []
-    for row_dict in rows:
-        # Create a row with values in the same order as column_names
-        processed_row = [row_dict.get(col.get('name', '')) for col in columns]
-        processed_rows.append(processed_row)
+    _record_query(ctx, query, batch)
     
     return {
-        'column_names': column_names,
-        'columns': columns,
-        'rows': processed_rows,
-        'raw_rows': rows,
-        'row_count': row_count
+        'column_names': batch.column_names,
+        'rows': batch.rows[:limit] if limit is not None else batch.rows,
+        'row_count': batch.row_count
     }
 
+@lru_cache(maxsize=64)
+def _markdown_header(column_names: Tuple[str, ...]) -> str:
+    """Markdown table header and separator rows, shared by results of the same shape"""
+    return " | ".join(column_names) + "\n" + " | ".join(["---"] * len(column_names)) + "\n"
+
 # Define tools
 @mcp.tool()
-def execute_query(query: str, ctx: Context) -> str:
+async def execute_query(query: str, ctx: Context) -> str:
     """Execute a SQL query and return results as a markdown table"""
+    if ctx.request_context.lifespan_context.query_runner is None:
+        return _db_not_configured()
     try:
-        result = _execute_and_get_results(query, ctx)
+        result = await _execute_and_get_results(query, ctx, limit=10)  # Limit to first 10 rows for display
         
         # Build a markdown table for output
-        header = " | ".join(result['column_names'])
-        separator = " | ".join(["---"] * len(result['column_names']))
-        
-        table_rows = []
-        for row in result['rows'][:10]:  # Limit to first 10 rows for display
-            table_rows.append(" | ".join(str(cell) for cell in row))
-        
-        result_table = f"{header}\n{separator}\n" + "\n".join(table_rows)
+        out = StringIO()
+        out.write(_markdown_header(tuple(result['column_names'])))
+        for i, row in enumerate(result['rows']):
+            if i:
+                out.write("\n")
+            out.write(" | ".join(str(cell) for cell in row))
         
         if result['row_count'] > 10:
-            result_table += f"\n\n... and {result['row_count'] - 10} more rows (total: {result['row_count']})"
+            out.write(f"\n\n... and {result['row_count'] - 10} more rows (total: {result['row_count']})")
             
-        return result_table
+        return out.getvalue()
     except Exception as e:
         return f"Error executing query: {str(e)}"
 
 @mcp.tool()
-def execute_query_json(query: str, ctx: Context) -> str:
-    """Execute a SQL query and return results as JSON"""
+async def execute_query_json(query: str, ctx: Context) -> str:
+    """Execute a SQL query and return results as JSON
+
+    The output is compact JSON of the form {"columns": [...], "rows": [{...}], "row_count": n}.
+    Numeric values are JSON numbers and dates and times are ISO 8601 strings.
+    """
+    query_runner = ctx.request_context.lifespan_context.query_runner
+    if query_runner is None:
+        return _db_not_configured()
     try:
-        result = _execute_and_get_results(query, ctx)
+        if _read_only_kind(query) in _STREAMABLE_STATEMENTS:
+            # Postgres builds the JSON itself, so rows never become Python objects
+            key = (_cache_key(query), "json")
+            output = _result_cache.get(key)
+            if output is None:
+                try:
+                    output = await query_runner.run_query_json(query)
+                    _result_cache[key] = output
+                except DBAPIError as e:
+                    # Some statements are not valid as a subquery; run them as written below.
+                    # Any other error (timeout, permissions, ...) would only repeat, so report it.
+                    if getattr(e.orig, "sqlstate", None) not in _NESTING_SQLSTATES:
+                        raise
+                    output = None
+            if output is not None:
+                _record_query(ctx, query, None)
+                return output
         
-        # Create a more compact representation for JSON output
-        output = {
-            'columns': result['column_names'],
-            'rows': result['raw_rows'],  # Return the original row dictionaries for JSON output
-            'row_count': result['row_count']
-        }
-        return json.dumps(output, indent=2)
+        result = await _execute_and_get_results(query, ctx)
+        
+        column_names = result['column_names']
+        # Same layout as the json_agg path; enc_hook=str covers types msgspec does not know
+        columns_json = _JSON_ENCODER.encode(column_names).decode()
+        rows_json = _JSON_ENCODER.encode([dict(zip(column_names, row)) for row in result['rows']]).decode()
+        return f'{{"columns": {columns_json}, "rows": {rows_json}, "row_count": {result["row_count"]}}}'
     except Exception as e:
         return f"Error executing query: {str(e)}"
 
 @mcp.tool()
-def get_table_columns(table_name: str) -> str:
-    """Get column names for a specific table"""
+async def describe_tables(tables: Optional[List[str]] = None) -> str:
+    """Get column names and types for the given tables, or for every table if none are given
+
+    Tables outside the public schema are named schema.table; a bare name matches it in any schema.
+    """
+    query_runner = init_query_runner()
+    if query_runner is None:
+        return _db_not_configured()
     try:
-        columns = query_runner.get_table_columns(table_name)
-        return json.dumps(columns)
+        key = tuple(sorted(tables)) if tables is not None else None
+        description = await _cached_catalog(
+            ("describe_tables", key),
+            lambda: query_runner.describe_tables(tables),
+        )
+        return orjson.dumps(description).decode()
     except Exception as e:
-        return f"Error getting columns for table {table_name}: {str(e)}"
+        return f"Error describing tables: {str(e)}"
 
 @mcp.tool()
-def get_table_types(table_name: str) -> str:
-    """Get column types for a specific table"""
-    try:
-        types = query_runner.get_table_types(table_name)
-        return json.dumps(types)
-    except Exception as e:
-        return f"Error getting types for table {table_name}: {str(e)}"
+def invalidate_cache() -> str:
+    """Clear cached query results so the next queries hit the database"""
+    _result_cache.clear()
+    return "Query result cache cleared."
+
+@mcp.tool()
+def refresh_schema() -> str:
+    """Clear cached schema and table descriptions after the schema has changed"""
+    _schema_cache.clear()
+    return "Schema cache cleared."
 
 # Define prompts
+# Every prompt starts with the same static preamble and puts the per-call text last,
+# so LLM providers can serve the shared prefix from their prompt cache.
+_SQL_EXPERT_PREAMBLE = """You are an expert PostgreSQL engineer helping a user work with a live database through the tools of this MCP server.
+
+Tools available:
+- describe_tables: column names and data types for some or all tables. Use it before writing a query so that table and column names are exact.
+- execute_query: runs a query and returns up to 10 rows as a markdown table, plus the total row count.
+- execute_query_json: runs a query and returns every row as JSON. Use it only when the full result is needed.
+- get_query_history: the queries already run in this session.
+- refresh_schema and invalidate_cache: clear cached schema and query results after the database has changed.
+
+Guidelines:
+- Write standard PostgreSQL. Qualify ambiguous column names with their table alias, and use explicit JOIN ... ON clauses rather than comma joins.
+- Select only the columns the question needs instead of SELECT *, and add ORDER BY whenever the order of rows matters.
+- Add a LIMIT when exploring data, and prefer aggregates (COUNT, SUM, AVG, GROUP BY) over fetching many rows to count them in the answer.
+- Never run INSERT, UPDATE, DELETE or DDL statements unless the user explicitly asks for a change to the data or schema.
+- When explaining a query, describe what it returns, how its joins and filters shape the result, and any edge cases such as NULL handling or duplicate rows.
+- When optimizing a query, keep its results identical. Point out missing indexes, non-sargable predicates, unnecessary subqueries or sorts, and N+1 patterns, and show the rewritten query with a short justification for each change.
+- If the question is ambiguous or the schema does not contain the needed data, say so rather than guessing."""
+
 @mcp.prompt()
-def sql_query() -> str:
+def sql_query() -> List[Message]:
     """Create an SQL query against the database"""
-    return "Please help me write a SQL query for the following question:\n\n"
+    return [
+        UserMessage(_SQL_EXPERT_PREAMBLE),
+        UserMessage("Please help me write a SQL query for the following question:\n\n"),
+    ]
 
 @mcp.prompt()
-def explain_query(query: str) -> str:
+def explain_query(query: str) -> List[Message]:
     """Explain what a SQL query does"""
-    return f"Can you explain what the following SQL query does?\n\n```sql\n{query}\n```"
+    return [
+        UserMessage(_SQL_EXPERT_PREAMBLE),
+        UserMessage(f"Can you explain what the following SQL query does?\n\n---\nQUERY:\n```sql\n{query}\n```"),
+    ]
 
 @mcp.prompt()
-def optimize_query(query: str) -> str:
+def optimize_query(query: str) -> List[Message]:
     """Optimize a SQL query for better performance"""
-    return f"Can you optimize the following SQL query for better performance?\n\n```sql\n{query}\n```"
+    return [
+        UserMessage(_SQL_EXPERT_PREAMBLE),
+        UserMessage(f"Can you optimize the following SQL query for better performance?\n\n---\nQUERY:\n```sql\n{query}\n```"),
+    ]
+
+# Each frame on the socket transport is a big-endian uint32 length followed by a JSON-RPC message
+_FRAME_HEADER = struct.Struct("!I")
+# Larger lengths can only come from a corrupt header, and are not worth allocating for
+_MAX_FRAME_SIZE = 64 << 20
+
+@asynccontextmanager
+async def socket_server(sock: socket.socket):
+    """Exchange MCP messages over a connected unix socket using length-prefixed frames"""
+    read_stream_writer, read_stream = anyio.create_memory_object_stream(0)
+    write_stream, write_stream_reader = anyio.create_memory_object_stream(0)
+    reader, writer = await asyncio.open_unix_connection(sock=sock)
+
+    async def socket_reader():
+        async with read_stream_writer:
+            while True:
+                try:
+                    header = await reader.readexactly(_FRAME_HEADER.size)
+                    (size,) = _FRAME_HEADER.unpack(header)
+                    if size > _MAX_FRAME_SIZE:
+                        # The stream cannot be resynchronized after a bad header
+                        await read_stream_writer.send(ValueError(f"Frame of {size} bytes exceeds {_MAX_FRAME_SIZE}"))
+                        return
+                    payload = await reader.readexactly(size)
+                except asyncio.IncompleteReadError:
+                    # Client closed the socket
+                    return
+                try:
+                    message = types.JSONRPCMessage.model_validate_json(payload)
+                except Exception as exc:
+                    await read_stream_writer.send(exc)
+                    continue
+                await read_stream_writer.send(SessionMessage(message))
+
+    async def socket_writer():
+        async with write_stream_reader:
+            async for session_message in write_stream_reader:
+                payload = session_message.message.model_dump_json(by_alias=True, exclude_none=True).encode()
+                writer.write(_FRAME_HEADER.pack(len(payload)) + payload)
+                await writer.drain()
+
+    try:
+        async with anyio.create_task_group() as tg:
+            tg.start_soon(socket_reader)
+            tg.start_soon(socket_writer)
+            yield read_stream, write_stream
+    finally:
+        writer.close()
+
+async def run_socket_async(sock: socket.socket) -> None:
+    """Run the MCP server over a unix socket"""
+    async with socket_server(sock) as (read_stream, write_stream):
+        await mcp._mcp_server.run(
+            read_stream,
+            write_stream,
+            mcp._mcp_server.create_initialization_options(),
+        )
+
+def _backend_options() -> Dict[str, Any]:
+    """Run on uvloop when it is installed, falling back to the default asyncio loop"""
+    try:
+        import uvloop  # noqa: F401
+    except ImportError:
+        return {}
+    return {"use_uvloop": True}
 
 def main():
-    print("Starting Legion MCP server...")
-    mcp.run()
+    args = parse_args()
+    print("Starting Legion MCP server...", file=sys.stderr)
+    if args.socket_fd is not None:
+        anyio.run(run_socket_async, socket.socket(fileno=args.socket_fd), backend_options=_backend_options())
+    else:
+        anyio.run(mcp.run_stdio_async, backend_options=_backend_options())
 
 if __name__ == "__main__":
     main() 
\ No newline at end of file
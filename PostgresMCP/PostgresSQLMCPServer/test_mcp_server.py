@@ -0,0 +1,69 @@
+import pytest
+from sqlalchemy.dialects.postgresql import asyncpg
+
+from mcp_server import _read_only_kind, _subquery, _user_sql
+
+
+@pytest.mark.parametrize("query, kind", [
+    ("SELECT 1", "SELECT"),
+    ("  select * from t;", "SELECT"),
+    ("-- leading\n/* block */ WITH a AS (SELECT 1) SELECT * FROM a", "WITH"),
+    ("(SELECT 1) UNION (SELECT 2)", "SELECT"),
+    ("SELECT 'update' AS word, \"delete\" FROM t", "SELECT"),
+    ("SELECT $$ insert into $$", "SELECT"),
+    ("SELECT 1 -- trailing delete comment", "SELECT"),
+    ("SHOW server_version", "SHOW"),
+    ("EXPLAIN SELECT 1", "EXPLAIN"),
+    ("explain (costs off) select 1", "EXPLAIN"),
+    ("EXPLAIN DELETE FROM t", "EXPLAIN"),
+])
+def test_read_only_statements(query, kind):
+    assert _read_only_kind(query) == kind
+
+
+@pytest.mark.parametrize("query", [
+    "",
+    "-- only a comment",
+    "DELETE FROM t",
+    "UPDATE t SET a = 1",
+    "selection",
+    "EXPLAIN ANALYZE DELETE FROM t",
+    "EXPLAIN /* c */ ANALYZE DELETE FROM t",
+    "EXPLAIN (BUFFERS, ANALYZE) SELECT 1",
+    "/* x */ DELETE FROM t WHERE note = '*/ select'",
+    "WITH d AS (DELETE FROM t RETURNING *) SELECT * FROM d",
+    "WITH i AS (INSERT INTO t VALUES (1) RETURNING *) SELECT * FROM i",
+    "SELECT * INTO t2 FROM t",
+    "SELECT * FROM t FOR UPDATE",
+    "SELECT 1; DELETE FROM t",
+    "SELECT E'\\'' ; DELETE FROM t",
+])
+def test_statements_that_may_write(query):
+    assert _read_only_kind(query) is None
+
+
+@pytest.mark.parametrize("query", [
+    "SELECT x::int FROM t",
+    "SELECT ':z'",
+    "SELECT 1 AS \"a:b\"",
+    "SELECT $$ a :b; $$",
+    "SELECT $f$ :b $f$",
+])
+def test_user_sql_has_no_bind_parameters(query):
+    compiled = _user_sql(query).compile(dialect=asyncpg.dialect())
+    assert str(compiled) == query
+    assert compiled.params == {}
+
+
+@pytest.mark.parametrize("query, body", [
+    ("SELECT 1", "SELECT 1"),
+    ("SELECT 1;", "SELECT 1"),
+    ("SELECT 1; -- note", "SELECT 1"),
+    ("SELECT 1 /* c */ ;  \n", "SELECT 1"),
+    ("-- lead\nSELECT 1", "SELECT 1"),
+    ("SELECT '; --' AS a", "SELECT '; --' AS a"),
+    ("SELECT x::int FROM t", "SELECT x::int FROM t"),
+    ("SELECT $$ ; -- $$;", "SELECT $$ ; -- $$"),
+])
+def test_subquery(query, body):
+    assert _subquery(query) == f"(\n{body}\n)"